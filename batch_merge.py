@@ -0,0 +1,8 @@
+# Пакетное объединение каталога выгрузок AO db prod с одним справочником MVDR23.
+# Вся логика — в пакете comrate: python -m comrate batch --help
+import sys
+
+from comrate.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main(['batch', *sys.argv[1:]]))
@@ -0,0 +1,24 @@
+# Объединение выгрузок AO db prod со справочником MVDR23.
+# Этапы конвейера лежат в comrate.pipeline; модули с pandas и sklearn
+# загружаются только при первом обращении к соответствующим именам.
+import importlib
+
+from comrate.options import PRESETS, MergeOptions, make_options
+
+_LAZY = {
+    'merge_frames': 'comrate.pipeline',
+    'load_reference': 'comrate.pipeline',
+    'prepare_reference': 'comrate.pipeline',
+    'run': 'comrate.pipeline',
+    'run_batch': 'comrate.batch',
+}
+
+__all__ = ['MergeOptions', 'PRESETS', 'make_options', *_LAZY]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module 'comrate' has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,5 @@
+import sys
+
+from comrate.cli import main
+
+sys.exit(main())
@@ -0,0 +1,135 @@
+import glob
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+
+import pandas as pd
+
+from comrate import pipeline
+
+# Справочник, загруженный один раз на весь пакет файлов.
+# В рабочих процессах он доступен только для чтения.
+_reference = None
+
+# Текстовые столбцы сводки; остальные — счётчики статистики
+SUMMARY_TEXT_COLUMNS = ('input_file', 'output_file', 'unmatched_file', 'error')
+
+
+# Список входных файлов AO: каталог (все *.csv в нём) или glob-шаблон
+def collect_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(glob.glob(os.path.join(pattern, '*.csv'))))
+        else:
+            files.extend(sorted(glob.glob(pattern)))
+    return list(dict.fromkeys(files))
+
+
+# Имена результатов для входных файлов: путь относительно общего каталога входов
+# без расширения, каталоги через '__' (sysA/day1.csv -> sysA__day1). Для файлов
+# из одного каталога это просто имя файла. Совпадающие имена — ошибка:
+# результаты перезаписывали бы друг друга.
+def output_names(files):
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    names = {
+        path: os.path.splitext(os.path.relpath(os.path.abspath(path), base))[0].replace(os.sep, '__')
+        for path in files
+    }
+    clashes = [name for name, count in Counter(names.values()).items() if count > 1]
+    if clashes:
+        raise ValueError(f"Входные файлы дают одинаковые имена результатов: {', '.join(sorted(clashes))}")
+    return names
+
+
+# Параметры для одного входного файла: результаты называются по имени входа
+def file_options(ao_path, output_dir, options, name=None):
+    name = name or os.path.splitext(os.path.basename(ao_path))[0]
+    return replace(
+        options,
+        ao_file=ao_path,
+        output_file=os.path.join(output_dir, f'{name}_result.csv'),
+        unmatched_file=os.path.join(output_dir, f'{name}_unmatched_with_id.csv')
+    )
+
+
+# Объединение одного файла AO с общим справочником
+def merge_file(options, reference=None):
+    reference = reference or _reference
+    logging.info(f"Обработка файла {options.ao_file}")
+    ao_db_prod = pipeline.read_csv(options.ao_file)
+    final_data, unmatched_with_id, stats = pipeline.merge_frames(ao_db_prod, options=options, reference=reference)
+    pipeline.write_outputs(final_data, unmatched_with_id, options)
+    return {
+        'input_file': options.ao_file,
+        'output_file': options.output_file,
+        'unmatched_file': options.unmatched_file if unmatched_with_id is not None else '',
+        **stats,
+    }
+
+
+# Инициализация рабочего процесса: справочник и лог-файл родителя (в его кодировке).
+# При старте через fork справочник наследуется без копирования.
+def _init_worker(reference, log_file, log_encoding=None):
+    global _reference
+    _reference = reference
+    if log_file and not logging.getLogger().handlers:
+        logging.basicConfig(
+            filename=log_file,
+            encoding=log_encoding,
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+
+
+# Запись сводки для файла, который не удалось обработать: пакет продолжается
+def _failed(ao_path, error):
+    logging.error(f"Ошибка при обработке файла {ao_path}: {error!r}")
+    return {'input_file': ao_path, 'error': repr(error)}
+
+
+# Пакетная обработка: справочник читается один раз, файлы AO обрабатываются
+# параллельно в пуле процессов, итоговая статистика сохраняется в один файл
+def run_batch(inputs, options, output_dir, workers=None, summary_file='batch_summary.csv', log_file=None):
+    files = collect_inputs(inputs)
+    if not files:
+        raise FileNotFoundError(f"Не найдено входных файлов по шаблонам: {inputs}")
+    names = output_names(files)
+    os.makedirs(output_dir, exist_ok=True)
+    reference = pipeline.load_reference(options)
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    logging.info(f"Файлов для обработки: {len(files)}, процессов: {workers}")
+
+    results = []
+    if workers == 1:
+        for ao_path in files:
+            try:
+                results.append(merge_file(file_options(ao_path, output_dir, options, names[ao_path]), reference))
+            except Exception as e:
+                results.append(_failed(ao_path, e))
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(reference, log_file, options.log_encoding)) as pool:
+            futures = {
+                ao_path: pool.submit(merge_file, file_options(ao_path, output_dir, options, names[ao_path]))
+                for ao_path in files
+            }
+            for ao_path, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(_failed(ao_path, e))
+
+    summary = pd.DataFrame(results)
+    # Строки ошибок без статистики не должны превращать счётчики в float
+    counts = [column for column in summary if column not in SUMMARY_TEXT_COLUMNS]
+    summary[counts] = summary[counts].astype('Int64')
+    summary_path = os.path.join(output_dir, summary_file)
+    summary.to_csv(summary_path, sep=';', index=False, encoding='utf-8')
+    logging.info(f"Сводка сохранена в {summary_path}")
+    return summary
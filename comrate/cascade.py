@@ -0,0 +1,66 @@
+from collections import Counter
+
+from comrate.normalize import is_missing
+
+# Каскад точных поисков для строк, не сопоставленных по (name_ru, regula_code).
+# Около тысячи строк MVDR23 не имеют departmentcode, и многие ключи AO db prod
+# отличаются только кодом. Каждый этап — отдельный словарь, поэтому поиск
+# остаётся O(1) на строку; в словарь попадают только однозначные ключи.
+CASCADE_STAGES = ('name', 'code', 'name_region')
+
+
+# Регион AO db prod — первые две цифры regula_code ('022-055' -> '02', '772-079' -> '77')
+def ao_region(code):
+    if len(code) >= 3 and code[:3].isdigit():
+        return code[:2]
+    return ''
+
+
+# Регион MVDR23 — regioncode, дополненный нулём до двух цифр ('2' -> '02')
+def mvdr_region(regioncode):
+    if is_missing(regioncode):
+        return ''
+    return str(regioncode).strip().zfill(2)
+
+
+def _complete(key):
+    if isinstance(key, tuple):
+        return all(key)
+    return bool(key)
+
+
+# Словарь ключ -> (recordid, исходный departmentname) только для ключей,
+# которые встречаются в справочнике ровно один раз
+def unique_index(keys, recordids, departmentnames):
+    keys = list(keys)
+    counts = Counter(keys)
+    return {
+        key: (recordid, departmentname)
+        for key, recordid, departmentname in zip(keys, recordids, departmentnames)
+        if counts[key] == 1 and _complete(key)
+    }
+
+
+# Словари этапов каскада по нормализованному справочнику
+def build_cascade_index(mvdr23):
+    names = mvdr23['departmentname'].tolist()
+    regions = [mvdr_region(regioncode) for regioncode in mvdr23['regioncode']]
+    keys = {
+        'name': names,
+        'code': mvdr23['departmentcode'].tolist(),
+        'name_region': list(zip(names, regions)),
+    }
+    recordids = mvdr23['recordid'].tolist()
+    departmentnames = mvdr23['original_departmentname'].tolist()
+    return {stage: unique_index(keys[stage], recordids, departmentnames) for stage in CASCADE_STAGES}
+
+
+# Ключи этапов каскада для строк нормализованного AO db prod
+def cascade_keys(ao_db_prod):
+    names = ao_db_prod['name_ru'].tolist()
+    codes = ao_db_prod['regula_code'].tolist()
+    return {
+        'name': names,
+        'code': codes,
+        'name_region': [(name, ao_region(code)) for name, code in zip(names, codes)],
+    }
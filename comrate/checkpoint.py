@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from collections import namedtuple
+
+import pandas as pd
+
+from comrate import pipeline
+from comrate.options import STAGE_NAMES
+
+# Контрольные точки этапов конвейера. Результат каждого этапа сохраняется
+# в pickle-файл, имя которого — хеш от ключа предыдущего этапа и параметров
+# текущего; ключ этапа read — хеш содержимого входных файлов. Поэтому при
+# изменении только, например, параметров выборки несопоставленных строк
+# этапы от чтения до сортировки загружаются из готовых файлов.
+
+# Версия формата артефактов: при несовместимых изменениях этапов её нужно увеличить.
+# Кроме неё в ключ входят версия pandas и хеш исходников пакета comrate,
+# поэтому артефакты от другого кода не подхватываются.
+CHECKPOINT_VERSION = 1
+
+# inputs — нужные этапу значения, outputs — что он возвращает,
+# params — поля MergeOptions, влияющие на результат, cached — сохранять ли артефакт.
+# Не сохраняются исходные таблицы (их сразу заменяет нормализация) и промежуточные
+# final_data этапов append и restore (их сразу переписывает следующий этап).
+Stage = namedtuple('Stage', ['name', 'run', 'inputs', 'outputs', 'params', 'cached'])
+
+
+def _read(state, options):
+    return pipeline.read_inputs(options)
+
+
+def _normalize(state, options):
+    return (
+        pipeline.normalize_ao(state['ao_db_prod'], options),
+        pipeline.normalize_reference(state['mvdr23'], options),
+    )
+
+
+def _index(state, options):
+    return (pipeline.index_reference(state['mvdr_normalized'], options),)
+
+
+def _match(state, options):
+    return pipeline.match(state['ao_normalized'], state['reference'], options)
+
+
+def _append(state, options):
+    return (pipeline.append_unprocessed(state['ao_processed'], state['reference'], state['matched_ids'], options),)
+
+
+def _restore(state, options):
+    return (pipeline.restore_originals(state['final_data'], state['reference'], options),)
+
+
+def _sort(state, options):
+    return (pipeline.sort_by_id(state['final_data'], options),)
+
+
+def _stats(state, options):
+    unmatched_with_id = pipeline.select_unmatched(state['ao_processed'], state['final_data'], options)
+    stats = pipeline.compute_stats(state['ao_processed'], state['reference']['mvdr23'], state['final_data'],
+                                   state['matched_ids'], unmatched_with_id)
+    pipeline.log_stats(stats)
+    return unmatched_with_id, stats
+
+
+def _write(state, options):
+    pipeline.write_outputs(state['final_data'], state['unmatched_with_id'], options)
+    return ()
+
+
+STAGES = (
+    Stage('read', _read, (), ('ao_db_prod', 'mvdr23'), (), False),
+    Stage('normalize', _normalize, ('ao_db_prod', 'mvdr23'), ('ao_normalized', 'mvdr_normalized'),
+          ('normalization', 'source_column'), True),
+    Stage('index', _index, ('mvdr_normalized',), ('reference',), ('match_mode',), True),
+    Stage('match', _match, ('ao_normalized', 'reference'), ('ao_processed', 'matched_ids'),
+          ('reset_epgu', 'unique_recordids', 'match_mode', 'tfidf_threshold', 'tfidf_top_k'), True),
+    Stage('append', _append, ('ao_processed', 'reference', 'matched_ids'), ('final_data',),
+          ('appended_name_en', 'restore_originals', 'source_column'), False),
+    Stage('restore', _restore, ('final_data', 'reference'), ('final_data',), ('restore_originals',), False),
+    Stage('sort', _sort, ('final_data',), ('final_data',), ('sort_by_id',), True),
+    Stage('stats', _stats, ('ao_processed', 'reference', 'final_data', 'matched_ids'),
+          ('unmatched_with_id', 'stats'), ('unmatched',), True),
+    Stage('write', _write, ('final_data', 'unmatched_with_id'), (), ('output_file', 'unmatched_file'), False),
+)
+assert tuple(stage.name for stage in STAGES) == STAGE_NAMES
+
+
+# SHA-256 содержимого файла
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# SHA-256 исходников пакета comrate: изменение кода любого этапа делает артефакты недействительными
+def source_digest():
+    digest = hashlib.sha256()
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith('.py'):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(package_dir, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Ключи всех этапов: каждый зависит от ключа предыдущего и собственных параметров
+def stage_keys(options):
+    parent = json.dumps([CHECKPOINT_VERSION, pd.__version__, source_digest(),
+                         file_digest(options.ao_file), file_digest(options.reference_file)])
+    keys = []
+    for stage in STAGES:
+        params = {field: getattr(options, field) for field in stage.params}
+        payload = json.dumps([parent, stage.name, params], sort_keys=True)
+        parent = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        keys.append(parent)
+    return keys
+
+
+def artifact_path(checkpoint_dir, stage, key):
+    return os.path.join(checkpoint_dir, f'{stage.name}-{key[:24]}.pkl')
+
+
+def save_artifact(path, values):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(values, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# Значения, которые этапам после resume нужно получить из артефактов
+# (а не от этапов, выполняемых в этом же прогоне)
+def _needed(resume, until_index):
+    needed, produced = set(), set()
+    for stage in STAGES[resume + 1:until_index + 1]:
+        needed |= set(stage.inputs) - produced
+        produced |= set(stage.outputs)
+    return needed
+
+
+# Последний этап (до from_index), с которого можно продолжить: его артефакт есть,
+# и все нужные последующим этапам значения можно загрузить из артефактов
+def _resume_point(paths, from_index, until_index):
+    for resume in range(min(from_index - 1, until_index), -1, -1):
+        if not STAGES[resume].cached or not os.path.exists(paths[resume]):
+            continue
+        if all(_producer(name, resume, paths) is not None for name in _needed(resume, until_index)):
+            return resume
+    return -1
+
+
+# Последний этап не позже resume, который выдаёт значение name и чей артефакт сохранён
+def _producer(name, resume, paths):
+    for index in range(resume, -1, -1):
+        if name in STAGES[index].outputs:
+            return index if os.path.exists(paths[index]) else None
+    return None
+
+
+# Артефакты каждого набора параметров хранятся, пока каталог не очистят вручную
+def log_checkpoint_size(checkpoint_dir):
+    paths = [os.path.join(checkpoint_dir, name) for name in os.listdir(checkpoint_dir) if name.endswith('.pkl')]
+    size_mb = sum(os.path.getsize(path) for path in paths) / 1024 ** 2
+    logging.info(f"Каталог контрольных точек {checkpoint_dir}: артефактов {len(paths)}, {size_mb:.1f} МБ")
+
+
+# Прогон конвейера с контрольными точками. from_stage — первый этап, который
+# выполняется заново даже при наличии артефакта; until_stage — последний выполняемый.
+# Возвращает статистику (или None, если этап stats не выполнялся).
+def run_staged(options, checkpoint_dir, from_stage=None, until_stage=None):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    from_index = STAGE_NAMES.index(from_stage) if from_stage else len(STAGES)
+    until_index = STAGE_NAMES.index(until_stage) if until_stage else len(STAGES) - 1
+    keys = stage_keys(options)
+    paths = [artifact_path(checkpoint_dir, stage, key) for stage, key in zip(STAGES, keys)]
+
+    resume = _resume_point(paths, from_index, until_index)
+    state = {}
+    if resume >= 0:
+        logging.info(f"Продолжение после этапа {STAGES[resume].name}: этапы до него загружаются из {checkpoint_dir}")
+        needed = _needed(resume, until_index)
+        for index in sorted({_producer(name, resume, paths) for name in needed}):
+            values = load_artifact(paths[index])
+            state.update({name: value for name, value in values.items() if name in needed})
+            logging.info(f"Этап {STAGES[index].name}: загружен артефакт {paths[index]}")
+
+    for stage, path in zip(STAGES[resume + 1:until_index + 1], paths[resume + 1:until_index + 1]):
+        logging.info(f"Этап {stage.name}: выполнение")
+        values = dict(zip(stage.outputs, stage.run(state, options)))
+        state.update(values)
+        if stage.cached:
+            save_artifact(path, values)
+            logging.info(f"Этап {stage.name}: артефакт сохранён в {path}")
+
+    log_checkpoint_size(checkpoint_dir)
+    if 'stats' not in state and until_index >= STAGE_NAMES.index('stats'):
+        state.update(load_artifact(paths[STAGE_NAMES.index('stats')]))
+    return state.get('stats')
@@ -0,0 +1,183 @@
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from comrate.options import PRESETS, STAGE_NAMES, make_options
+
+# Модули с pandas/sklearn импортируются внутри команд,
+# поэтому --help и lookup не тратят время на их загрузку
+
+
+# Настройка логирования: файл merge_files_<время>.log и, при необходимости, консоль
+def setup_logging(options):
+    log_file = f'merge_files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    handlers = [logging.FileHandler(log_file, encoding=options.log_encoding)]
+    if options.log_console:
+        handlers.append(logging.StreamHandler())
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+    return log_file
+
+
+def _add_merge_arguments(parser, default_preset):
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=default_preset,
+                        help=f"поведение одного из исходных скриптов (по умолчанию {default_preset})")
+    parser.add_argument('--reference', dest='reference_file', help="файл справочника MVDR23")
+    parser.add_argument('--normalization', choices=['upper', 'lower'],
+                        help="upper — без спецсимволов, верхний регистр; lower — нижний регистр")
+    parser.add_argument('--unmatched', choices=['none', 'final', 'ao'],
+                        help="откуда выбирать строки с id без epgu_code (none — не сохранять)")
+    parser.add_argument('--source-column', action=argparse.BooleanOptionalAction,
+                        help="столбец source (AO_db_prod / MVDR23) в результате")
+    parser.add_argument('--reset-epgu', action=argparse.BooleanOptionalAction,
+                        help="очищать epgu_code перед сопоставлением")
+    parser.add_argument('--unique-recordids', action=argparse.BooleanOptionalAction,
+                        help="присваивать каждый recordid только одной строке")
+    parser.add_argument('--restore-originals', action=argparse.BooleanOptionalAction,
+                        help="возвращать исходные regula_code и departmentname")
+    parser.add_argument('--sort-by-id', action=argparse.BooleanOptionalAction, help="сортировать результат по id")
+    parser.add_argument('--match-mode', choices=['exact', 'cascade', 'tfidf'],
+                        help="cascade — каскад точных поисков по названию, коду и региону; "
+                             "tfidf — ближайший сосед по n-граммам для строк без точного совпадения")
+    parser.add_argument('--tfidf-threshold', type=float, help="минимальное косинусное сходство TF-IDF")
+    parser.add_argument('--tfidf-top-k', type=int, help="число соседей TF-IDF для каждой строки")
+    parser.add_argument('--tfidf-memory-mb', type=int, help="бюджет памяти на блоки сходств TF-IDF, МБ")
+    parser.add_argument('--log-rows', action=argparse.BooleanOptionalAction, help="логировать каждую строку")
+    parser.add_argument('--log-encoding', help="кодировка лог-файла, например cp1251")
+    parser.add_argument('--log-console', action=argparse.BooleanOptionalAction, help="дублировать лог в консоль")
+
+
+_MERGE_FIELDS = (
+    'ao_file', 'reference_file', 'output_file', 'unmatched_file', 'normalization', 'unmatched',
+    'source_column', 'reset_epgu', 'unique_recordids', 'restore_originals', 'sort_by_id',
+    'match_mode', 'tfidf_threshold', 'tfidf_top_k', 'tfidf_memory_mb',
+    'log_rows', 'log_encoding', 'log_console',
+)
+
+
+def _options_from_args(args, **defaults):
+    overrides = {field: getattr(args, field, None) for field in _MERGE_FIELDS}
+    for field, value in defaults.items():
+        if overrides[field] is None:
+            overrides[field] = value
+    return make_options(args.preset, **overrides)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='comrate',
+        description="Объединение выгрузок AO db prod со справочником MVDR23"
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    merge = commands.add_parser('merge', help="объединить один файл AO db prod со справочником")
+    merge.add_argument('--ao', dest='ao_file', help="файл AO db prod")
+    merge.add_argument('--output', dest='output_file', help="итоговый файл")
+    merge.add_argument('--unmatched-output', dest='unmatched_file', help="файл строк с id без epgu_code")
+    merge.add_argument('--dry-run', action='store_true',
+                       help="пробный прогон по стратифицированной выборке: оценка доли совпадений, времени и памяти")
+    merge.add_argument('--sample-size', type=int, default=2000, help="размер выборки для --dry-run")
+    merge.add_argument('--strata-prefix-length', type=int, default=2,
+                       help="длина префикса regula_code, задающего страту для --dry-run")
+    merge.add_argument('--seed', type=int, default=0, help="зерно случайной выборки для --dry-run")
+    merge.add_argument('--checkpoint-dir',
+                       help="каталог контрольных точек этапов (по умолчанию checkpoints, если задан "
+                            "--from-stage или --until-stage). Каждый набор параметров занимает "
+                            "примерно в 10 раз больше входного файла; старые артефакты не удаляются, "
+                            "каталог можно очищать вручную")
+    merge.add_argument('--from-stage', choices=STAGE_NAMES,
+                       help="выполнить заново этот и последующие этапы, предыдущие загрузить из контрольных точек")
+    merge.add_argument('--until-stage', choices=STAGE_NAMES, help="остановиться после этого этапа")
+    _add_merge_arguments(merge, 'main')
+
+    batch = commands.add_parser('batch', help="объединить каталог выгрузок AO с одним справочником")
+    batch.add_argument('inputs', nargs='+', help="каталог или glob-шаблон файлов AO db prod")
+    batch.add_argument('--output-dir', default='batch_output', help="каталог для результатов")
+    batch.add_argument('--workers', type=int, help="число процессов (по умолчанию — число ядер)")
+    batch.add_argument('--summary', default='batch_summary.csv', help="имя файла сводной статистики")
+    _add_merge_arguments(batch, 'post_main')
+
+    lookup = commands.add_parser('lookup', help="найти подразделение в справочнике по названию и коду")
+    lookup.add_argument('name', help="название подразделения")
+    lookup.add_argument('--code', help="код подразделения")
+    lookup.add_argument('--reference', default=PRESETS['main'].reference_file, help="файл справочника MVDR23")
+    lookup.add_argument('--normalization', choices=['upper', 'lower'], default='upper')
+    return parser
+
+
+def run_merge(args):
+    options = _options_from_args(args)
+    setup_logging(options)
+    if args.dry_run:
+        from comrate.estimate import estimate, format_report
+
+        print(format_report(estimate(options, args.sample_size, args.strata_prefix_length, args.seed)))
+        return 0
+
+    checkpoint_dir = args.checkpoint_dir
+    if checkpoint_dir is None and (args.from_stage or args.until_stage):
+        checkpoint_dir = 'checkpoints'
+    if checkpoint_dir:
+        from comrate.checkpoint import run_staged
+
+        stats = run_staged(options, checkpoint_dir, args.from_stage, args.until_stage)
+        if args.until_stage and args.until_stage != 'write':
+            print(f"Выполнены этапы до {args.until_stage} включительно. Контрольные точки сохранены в '{checkpoint_dir}'.")
+            return 0
+    else:
+        from comrate import pipeline
+
+        stats = pipeline.run(options)
+    message = f"Обработка завершена. Результат сохранён в '{options.output_file}'."
+    if stats['unmatched_with_id'] is not None:
+        message += f" Строки с непустым id и пустым epgu_code сохранены в '{options.unmatched_file}'."
+    print(message + " Лог сохранён в файл.")
+    return 0
+
+
+def run_batch(args):
+    from comrate.batch import run_batch as run
+
+    options = _options_from_args(args, log_rows=False)
+    log_file = setup_logging(options)
+    summary = run(args.inputs, options, args.output_dir, args.workers, args.summary, log_file)
+    failed = int(summary['error'].notna().sum()) if 'error' in summary else 0
+    message = f"Обработано файлов: {len(summary) - failed}"
+    if failed:
+        message += f", с ошибками: {failed}"
+    print(f"{message}. Сводка сохранена в '{os.path.join(args.output_dir, args.summary)}'. Лог сохранён в файл.")
+    # Ненулевой код возврата, если хотя бы один файл не обработан
+    return 1 if failed else 0
+
+
+# Поиск по справочнику модулем csv, без загрузки pandas
+def run_lookup(args):
+    import csv
+    from comrate.normalize import get_normalizers
+
+    text_fn, code_fn = get_normalizers(args.normalization)
+    name = text_fn(args.name)
+    code = None if args.code is None else code_fn(args.code)
+    found = 0
+    with open(args.reference, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f, delimiter=';'):
+            if text_fn(row['departmentname']) != name:
+                continue
+            if code is not None and code_fn(row['departmentcode']) != code:
+                continue
+            print(f"{row['recordid']};{row['departmentname']};{row['departmentcode']}")
+            found += 1
+    if not found:
+        print("Совпадений не найдено", file=sys.stderr)
+    return 0 if found else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    handler = {'merge': run_merge, 'batch': run_batch, 'lookup': run_lookup}[args.command]
+    return handler(args)
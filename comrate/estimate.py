@@ -0,0 +1,265 @@
+import io
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from comrate import pipeline
+
+# Пробный прогон (--dry-run): стратифицированная выборка строк AO db prod проходит
+# через настоящую нормализацию и сопоставление, по ней оцениваются доли совпадений
+# с доверительными интервалами, время и память полного прогона.
+
+Z_95 = 1.96
+# Размер блока при чтении строк выборки
+SAMPLE_CHUNK_ROWS = 100_000
+
+
+# Страта строки — префикс исходного regula_code (по умолчанию код региона)
+def strata_of(codes, prefix_length):
+    return codes.fillna('').str.strip().str[:prefix_length]
+
+
+# Страты всех строк файла: разбирается только столбец regula_code
+def read_strata(ao_file, prefix_length):
+    return strata_of(pipeline.read_csv(ao_file, usecols=['regula_code'])['regula_code'], prefix_length)
+
+
+# Пропорциональная стратифицированная выборка: позиции строк в разборе файла
+def sample_positions(strata, sample_size, seed):
+    fraction = min(1.0, sample_size / max(len(strata), 1))
+    # Из каждой страты — не меньше одной строки, чтобы все страты вошли в оценку
+    quotas = strata.value_counts().map(lambda size: max(1, round(size * fraction)))
+    shuffled = strata.iloc[np.random.default_rng(seed).permutation(len(strata))]
+    rank = shuffled.groupby(shuffled).cumcount()
+    sampled = shuffled[rank < shuffled.map(quotas)]
+    return sampled.index.sort_values()
+
+
+# Строки выборки: файл читается блоками по chunksize строк, из каждого блока
+# остаются строки, чей номер в разборе входит в positions. Нумерация та же, что
+# у read_strata, поэтому многострочные поля и пустые строки выборку не сдвигают.
+def read_sample(ao_file, positions, chunksize=SAMPLE_CHUNK_ROWS):
+    parts = []
+    offset = 0
+    with pipeline.read_csv(ao_file, chunksize=chunksize) as reader:
+        for chunk in reader:
+            parts.append(chunk[np.isin(np.arange(offset, offset + len(chunk)), positions)])
+            offset += len(chunk)
+    if not parts:
+        return pipeline.read_csv(ao_file, nrows=0)
+    return pd.concat(parts, ignore_index=True)
+
+
+# Стратифицированная оценка доли и её дисперсия с поправкой на конечность страт.
+# pairs=True — для признаков, которые видны в выборке, только если в неё попали
+# обе строки пары (лишние дубликаты, конфликты recordid): доля в страте делится
+# на долю выборки в этой страте. Найденных пар единицы, поэтому дисперсия
+# берётся по их числу, а не по Бернулли для отдельных строк.
+def stratified_proportion(flags, sample_strata, population_counts, pairs=False):
+    total = population_counts.sum()
+    estimate = 0.0
+    variance = 0.0
+    for stratum, group in flags.groupby(sample_strata):
+        n_h = len(group)
+        size_h = population_counts.get(stratum, n_h)
+        weight = size_h / total
+        sampled_share = n_h / size_h
+        if pairs:
+            scale = weight / (n_h * sampled_share)
+            estimate += min(weight, scale * group.sum())
+            # Пара видна с вероятностью sampled_share ** 2: биномиальная дисперсия
+            # числа найденных пар, при малой доле выборки — пуассоновская
+            variance += scale ** 2 * group.sum() * (1 - sampled_share ** 2)
+        else:
+            p_h = group.mean()
+            estimate += weight * p_h
+            if n_h > 1:
+                variance += weight ** 2 * (1 - sampled_share) * p_h * (1 - p_h) / (n_h - 1)
+    return estimate, variance
+
+
+# Граница точного (Гарвуда) 95% интервала для среднего пуассоновского числа
+# при наблюдённом count: lam, при котором P(X <= count) = 0.025 (upper=True)
+# или P(X >= count) = 0.025
+def _poisson_bound(count, upper):
+    def cdf(k, lam):
+        if lam == 0:
+            return 1.0
+        return sum(math.exp(-lam + i * math.log(lam) - math.lgamma(i + 1)) for i in range(k + 1))
+
+    if not upper and count == 0:
+        return 0.0
+    low, high = 0.0, count + 10 * math.sqrt(count) + 10
+    for _ in range(60):
+        lam = (low + high) / 2
+        tail = cdf(count, lam) if upper else 1 - cdf(count - 1, lam)
+        if (tail > 0.025) == upper:
+            low = lam
+        else:
+            high = lam
+    return (low + high) / 2
+
+
+# Оценка и 95% доверительный интервал доли, видимой только по парам строк:
+# интервал Гарвуда для числа найденных в выборке пар, пересчитанный в долю
+def pair_interval(flags, sample_strata, population_counts):
+    estimate, _ = stratified_proportion(flags, sample_strata, population_counts, pairs=True)
+    count = int(flags.sum())
+    total = population_counts.sum()
+    if len(flags) >= total:
+        return estimate, estimate, estimate
+    # Вклад одной найденной пары; без найденных пар — при пропорциональной выборке
+    per_pair = estimate / count if count else total / max(len(flags), 1) ** 2
+    return (estimate, min(1.0, _poisson_bound(count, False) * per_pair),
+            min(1.0, _poisson_bound(count, True) * per_pair))
+
+
+# Оценка и 95% доверительный интервал для суммы независимых оценок долей.
+# Парные оценки завышены для ключей, повторённых много раз, и сумма может выйти
+# за [0, 1]: оценка ограничивается тем же отрезком, что и границы интервала.
+def interval(*parts, sign=1):
+    estimate = sum(part[0] for part in parts)
+    if sign < 0:
+        estimate = 1 - estimate
+    estimate = min(1.0, max(0.0, estimate))
+    half_width = Z_95 * math.sqrt(sum(part[1] for part in parts))
+    return estimate, max(0.0, estimate - half_width), min(1.0, estimate + half_width)
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+# Лог пробных объединений уходит в os.devnull теми же форматтерами, что и настоящий:
+# время записи строк лога (log_rows) входит в прогноз, а сам лог не засоряется
+@contextmanager
+def _discarded_log():
+    root = logging.getLogger()
+    handlers = root.handlers
+    null_handler = logging.StreamHandler(open(os.devnull, 'w', encoding='utf-8'))
+    null_handler.setFormatter(handlers[0].formatter if handlers else None)
+    root.handlers = [null_handler]
+    try:
+        yield
+    finally:
+        root.handlers = handlers
+        null_handler.stream.close()
+
+
+def _deep_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+# Пробный прогон: оценки по выборке из options.ao_file. Страты строятся по одному
+# столбцу regula_code, затем файл читается блоками и в памяти остаются только
+# строки выборки. Блочное чтение разбирает файл целиком, поэтому его время —
+# оценка времени чтения полного прогона.
+def estimate(options, sample_size=2000, prefix_length=2, seed=0):
+    logging.info(f"Пробный прогон: выборка {sample_size} строк из {options.ao_file}, страты по {prefix_length} символам regula_code")
+
+    with _discarded_log():
+        reference, reference_time = _timed(pipeline.load_reference, options)
+    strata, scan_time = _timed(read_strata, options.ao_file, prefix_length)
+    positions = sample_positions(strata, sample_size, seed)
+    sample, read_time = _timed(read_sample, options.ao_file, positions)
+    sample_strata = strata.loc[positions].reset_index(drop=True)
+    population_counts = strata.value_counts()
+    total_rows = len(strata)
+
+    # Время объединения — линейная модель a + b * n по выборке и её половине,
+    # с теми же настройками логирования, что и у полного прогона
+    half = sample.iloc[::2]
+    with _discarded_log():
+        _, half_time = _timed(pipeline.merge_frames, half, options=options, reference=reference)
+        (final_data, _, _), merge_time = _timed(pipeline.merge_frames, sample, options=options, reference=reference)
+    per_row = max(0.0, (merge_time - half_time) / max(len(sample) - len(half), 1))
+    fixed = max(0.0, merge_time - per_row * len(sample))
+
+    quiet = replace(options, log_rows=False)
+    with _discarded_log():
+        ao_processed, _ = pipeline.match(pipeline.normalize_ao(sample, quiet), reference, quiet)
+    has_id = pipeline.non_empty(ao_processed['id'])
+    matched = pipeline.non_empty(ao_processed['epgu_code'])
+    keys = list(zip(ao_processed['name_ru'], ao_processed['regula_code']))
+    candidate = pd.Series([key in reference['mvdr_dict'] for key in keys], index=ao_processed.index)
+    # Как в логе normalize_ao: повторы ключа после первой строки
+    duplicate = ao_processed.duplicated(subset=['name_ru', 'regula_code'], keep='first')
+
+    # Строки без кандидата в справочнике оцениваются напрямую, конфликты recordid и
+    # дубликаты — по найденным в выборке парам; доля совпадений — дополнение к сумме
+    no_candidate = stratified_proportion((~candidate & ~matched).astype(float), sample_strata, population_counts)
+    conflict = stratified_proportion((candidate & ~matched).astype(float), sample_strata, population_counts, pairs=True)
+    no_candidate_with_id = stratified_proportion((has_id & ~candidate & ~matched).astype(float), sample_strata, population_counts)
+    conflict_with_id = stratified_proportion((has_id & candidate & ~matched).astype(float), sample_strata, population_counts, pairs=True)
+
+    match_rate = interval(no_candidate, conflict, sign=-1)
+    unmatched_rate = interval(no_candidate_with_id, conflict_with_id)
+    conflict_rate = pair_interval((candidate & ~matched).astype(float), sample_strata, population_counts)
+    duplicate_rate = pair_interval(duplicate.astype(float), sample_strata, population_counts)
+
+    mvdr_rows = len(reference['mvdr23'])
+    projected_final_rows = total_rows + max(0.0, mvdr_rows - match_rate[0] * total_rows)
+    buffer = io.StringIO()
+    _, write_time = _timed(final_data.to_csv, buffer, sep=';', index=False)
+    write_per_row = write_time / max(len(final_data), 1)
+
+    ao_per_row = _deep_bytes(sample) / max(len(sample), 1)
+    final_per_row = _deep_bytes(final_data) / max(len(final_data), 1)
+    reference_bytes = _deep_bytes(reference['mvdr23'])
+    # Одновременно живут исходный, нормализованный и сопоставленный AO db prod и итог
+    projected_memory = reference_bytes + 3 * ao_per_row * total_rows + final_per_row * projected_final_rows
+
+    projected_time = (reference_time + read_time + fixed
+                      + per_row * total_rows + write_per_row * projected_final_rows)
+    report = {
+        'ao_file': options.ao_file,
+        'file_size_mb': os.path.getsize(options.ao_file) / 1024 ** 2,
+        'total_rows': total_rows,
+        'sample_rows': len(sample),
+        'strata': len(population_counts),
+        'match_rate': match_rate,
+        'unmatched_with_id_rate': unmatched_rate,
+        'unmatched_with_id': tuple(rate * total_rows for rate in unmatched_rate),
+        'conflict_rate': conflict_rate,
+        'duplicate_rate': duplicate_rate,
+        'projected_final_rows': int(projected_final_rows),
+        'projected_seconds': projected_time,
+        'projected_memory_mb': projected_memory / 1024 ** 2,
+        'sample_seconds': reference_time + scan_time + read_time + half_time + merge_time,
+    }
+    log_report(report)
+    return report
+
+
+def _interval(values, percent=True):
+    if percent:
+        return f"{values[0]:.2%} (95% ДИ {values[1]:.2%} – {values[2]:.2%})"
+    return f"{values[0]:.0f} (95% ДИ {values[1]:.0f} – {values[2]:.0f})"
+
+
+def format_report(report):
+    return "\n".join([
+        f"Пробный прогон по {report['sample_rows']} из {report['total_rows']} строк "
+        f"({report['strata']} страт), файл {report['file_size_mb']:.1f} МБ",
+        f" - Доля сопоставленных строк: {_interval(report['match_rate'])}",
+        f" - Строк с непустым id и пустым epgu_code: {_interval(report['unmatched_with_id'], percent=False)}",
+        f" - Доля строк с кандидатом, но без epgu_code (конфликты recordid): {_interval(report['conflict_rate'])}",
+        f" - Доля повторов ключа (name_ru, regula_code) после первой строки: {_interval(report['duplicate_rate'])}",
+        f" - Строк в итоговом файле: ~{report['projected_final_rows']}",
+        f" - Прогноз времени полного прогона: ~{report['projected_seconds']:.1f} с "
+        f"(пробный прогон занял {report['sample_seconds']:.1f} с)",
+        f" - Прогноз памяти: ~{report['projected_memory_mb']:.0f} МБ",
+    ])
+
+
+def log_report(report):
+    for line in format_report(report).splitlines():
+        logging.info(line)
@@ -0,0 +1,46 @@
+import re
+
+# Нормализация строк без зависимости от pandas: используется и в конвейере,
+# и в быстром поиске по справочнику из CLI
+
+
+# Пропущенное значение: None, NaN или pd.NA
+def is_missing(value):
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:
+        return True
+
+
+# Функция предобработки строк с удалением спецсимволов (для name_ru и departmentname)
+def preprocess_text(text):
+    if is_missing(text):
+        return ''
+    text = re.sub(r'[^A-Za-zА-Яа-я0-9\s]', '', str(text))
+    text = re.sub(r'\s+', ' ', text.strip()).upper()
+    return text
+
+
+# Функция предобработки для кодов (regula_code и departmentcode)
+def preprocess_code(text):
+    if is_missing(text):
+        return ''
+    return str(text).strip().upper()
+
+
+# Предобработка post_main3.py: нижний регистр, лишние пробелы удаляются
+def preprocess_lower(text):
+    if is_missing(text):
+        return ''
+    return ' '.join(str(text).strip().lower().split())
+
+
+# Функции нормализации (названий, кодов) для режима 'upper' или 'lower'
+def get_normalizers(mode):
+    if mode == 'upper':
+        return preprocess_text, preprocess_code
+    if mode == 'lower':
+        return preprocess_lower, preprocess_lower
+    raise ValueError(f"Неизвестный режим нормализации: {mode}")
@@ -0,0 +1,78 @@
+from dataclasses import dataclass, replace
+from typing import Optional
+
+
+# Параметры объединения AO db prod со справочником MVDR23.
+# Модуль не импортирует pandas, чтобы разбор аргументов CLI был мгновенным.
+@dataclass(frozen=True)
+class MergeOptions:
+    ao_file: str = 'AO db prod.csv'
+    reference_file: str = 'MVDR23_DEPARTMENTS_7UTF-8.csv'
+    output_file: str = 'result_file.csv'
+    unmatched_file: str = 'unmatched_with_id.csv'
+
+    # 'upper' — удаление спецсимволов и верхний регистр (main.py),
+    # 'lower' — только пробелы и нижний регистр (post_main3.py)
+    normalization: str = 'upper'
+    # Выборка строк с id и без epgu_code: 'none' — не сохранять,
+    # 'final' — из итогового результата, 'ao' — из обработанного AO db prod
+    unmatched: str = 'none'
+    # Столбец source (AO_db_prod / MVDR23) в итоговом результате
+    source_column: bool = False
+    # Очистка epgu_code перед сопоставлением
+    reset_epgu: bool = False
+    # Каждый recordid присваивается только первой строке с совпавшим ключом
+    unique_recordids: bool = True
+    # Возврат исходных regula_code и departmentname в результат
+    restore_originals: bool = True
+    sort_by_id: bool = True
+    appended_name_en: str = 'nan'
+
+    # 'exact' — только точный поиск, 'cascade' — каскад точных поисков по названию,
+    # коду и (названию, региону) (см. comrate/cascade.py), 'tfidf' — ближайший сосед
+    # TF-IDF для строк без точного совпадения (см. comrate/tfidf.py)
+    match_mode: str = 'exact'
+    tfidf_threshold: float = 0.85
+    tfidf_top_k: int = 5
+    tfidf_memory_mb: int = 512
+
+    log_rows: bool = True
+    log_encoding: Optional[str] = None
+    log_console: bool = False
+
+
+# Поведение исходных вариантов скрипта
+PRESETS = {
+    'main': MergeOptions(),
+    'post_main': MergeOptions(unmatched='final', log_encoding='cp1251'),
+    'post_main_2': MergeOptions(unmatched='ao', log_encoding='cp1251'),
+    # Совпадает с Post_main_v4.py по строкам и значениям, но не побайтно:
+    # unmatched_with_id.csv выбирается из итогового результата после сортировки,
+    # поэтому строки в нём идут по id, а не в порядке AO db prod, как в скрипте.
+    'post_main_v4': MergeOptions(unmatched='final', reset_epgu=True),
+    # Совпадает с post_main3.py по строкам и значениям, но не побайтно:
+    # - нет столбца original_regula_code (в исходном скрипте он заполнялся
+    #   только у добавленных строк MVDR23 и совпадал с их regula_code);
+    # - файлы читаются как строки, поэтому id пишутся как 1, а не 1.0;
+    # - лог пишется в merge_files_<время>.log, а не в log_<время>.txt.
+    'post_main3': MergeOptions(
+        output_file='processed_ao_db_prod.csv',
+        normalization='lower',
+        unmatched='final',
+        reset_epgu=True,
+        unique_recordids=False,
+        restore_originals=False,
+        sort_by_id=False,
+        appended_name_en='',
+        log_console=True
+    ),
+}
+
+
+# Пресет с переопределёнными параметрами (значения None пропускаются)
+def make_options(preset='main', **overrides):
+    return replace(PRESETS[preset], **{k: v for k, v in overrides.items() if v is not None})
+
+
+# Этапы конвейера в порядке выполнения (см. comrate/checkpoint.py)
+STAGE_NAMES = ('read', 'normalize', 'index', 'match', 'append', 'restore', 'sort', 'stats', 'write')
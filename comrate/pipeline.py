@@ -0,0 +1,347 @@
+import logging
+from functools import partial
+
+import pandas as pd
+
+from comrate.cascade import CASCADE_STAGES, build_cascade_index, cascade_keys
+from comrate.normalize import get_normalizers
+from comrate.options import MergeOptions
+
+AO_SOURCE = 'AO_db_prod'
+MVDR_SOURCE = 'MVDR23'
+
+
+def read_csv(path, **kwargs):
+    return pd.read_csv(path, sep=';', encoding='utf-8', dtype=str, **kwargs)
+
+
+# Чтение файлов
+def read_inputs(options):
+    logging.info("Начало чтения файлов")
+    try:
+        ao_db_prod = read_csv(options.ao_file)
+        mvdr23 = read_csv(options.reference_file)
+        logging.info("Файлы успешно прочитаны")
+    except Exception as e:
+        logging.error(f"Ошибка при чтении файлов: {e}")
+        raise
+    return ao_db_prod, mvdr23
+
+
+# Предобработка AO db prod; исходный regula_code сохраняется в original_regula_code
+def normalize_ao(ao_db_prod, options):
+    text_fn, code_fn = get_normalizers(options.normalization)
+    ao_db_prod = ao_db_prod.copy()
+    if options.source_column:
+        ao_db_prod['source'] = AO_SOURCE
+    ao_db_prod['original_regula_code'] = ao_db_prod['regula_code']
+    ao_db_prod['name_ru'] = ao_db_prod['name_ru'].apply(text_fn)
+    ao_db_prod['regula_code'] = ao_db_prod['regula_code'].apply(code_fn)
+
+    duplicates_ao = ao_db_prod.duplicated(subset=['name_ru', 'regula_code'], keep='first').sum()
+    logging.info(f"Найдено дубликатов в AO db prod по (name_ru, regula_code): {duplicates_ao}")
+    return ao_db_prod
+
+
+# Предобработка MVDR23; исходные значения сохраняются в original_departmentcode/name
+def normalize_reference(mvdr23, options):
+    text_fn, code_fn = get_normalizers(options.normalization)
+    mvdr23 = mvdr23.copy()
+    mvdr23['original_departmentcode'] = mvdr23['departmentcode']
+    mvdr23['original_departmentname'] = mvdr23['departmentname']
+    mvdr23['departmentname'] = mvdr23['departmentname'].apply(text_fn)
+    mvdr23['departmentcode'] = mvdr23['departmentcode'].apply(code_fn)
+    return mvdr23
+
+
+# Индекс справочника: словарь (departmentname, departmentcode) -> (recordid, исходный departmentname)
+# и исходные departmentname по recordid. При повторе ключа остаётся последняя строка.
+def build_index(mvdr23, log_duplicates=True):
+    logging.info("Создание словаря для поиска совпадений")
+    mvdr_dict = {}
+    duplicate_keys = 0
+    keys = zip(mvdr23['departmentname'], mvdr23['departmentcode'])
+    for key, recordid, departmentname in zip(keys, mvdr23['recordid'], mvdr23['original_departmentname']):
+        if key in mvdr_dict:
+            duplicate_keys += 1
+            if log_duplicates:
+                logging.warning(f"Дубликат в MVDR23 по ключу {key}: старый recordid={mvdr_dict[key][0]}, новый={recordid}")
+        mvdr_dict[key] = (recordid, departmentname)
+    logging.info(f"Словарь создан, размер: {len(mvdr_dict)} записей, дубликатов ключей: {duplicate_keys}")
+    return {
+        'mvdr23': mvdr23,
+        'mvdr_dict': mvdr_dict,
+        'recordid_to_departmentname': dict(zip(mvdr23['recordid'], mvdr23['original_departmentname'])),
+    }
+
+
+# Индексы нормализованного справочника для выбранного режима сопоставления
+def index_reference(mvdr23, options):
+    reference = build_index(mvdr23, options.log_rows)
+    if options.match_mode == 'cascade':
+        reference['cascade'] = build_cascade_index(mvdr23)
+    elif options.match_mode == 'tfidf':
+        from comrate.tfidf import build_tfidf_index
+
+        reference['tfidf'] = build_tfidf_index(mvdr23['departmentname'])
+    return reference
+
+
+# Нормализация и индексация уже прочитанного справочника
+def prepare_reference(mvdr23, options):
+    return index_reference(normalize_reference(mvdr23, options), options)
+
+
+# Чтение, нормализация и индексация справочника (один раз на пакет файлов)
+def load_reference(options):
+    logging.info(f"Чтение справочника {options.reference_file}")
+    return prepare_reference(read_csv(options.reference_file), options)
+
+
+# Кандидаты TF-IDF для строк AO db prod с позициями positions:
+# позиция строки -> (recordid, исходный departmentname, сходство)
+def find_tfidf_matches(ao_db_prod, reference, options, positions):
+    from comrate.tfidf import build_tfidf_index, nearest_mvdr
+
+    if len(positions) == 0:
+        return {}
+    mvdr23 = reference['mvdr23']
+    index = reference.get('tfidf') or build_tfidf_index(mvdr23['departmentname'])
+    rows = ao_db_prod.iloc[list(positions)]
+    logging.info(f"Поиск ближайших соседей TF-IDF в MVDR23 для {len(rows)} строк без точного совпадения")
+    found, scores = nearest_mvdr(
+        rows['name_ru'], rows['regula_code'],
+        mvdr23['departmentname'], mvdr23['departmentcode'],
+        k=options.tfidf_top_k, threshold=options.tfidf_threshold, memory_budget_mb=options.tfidf_memory_mb,
+        index=index
+    )
+    recordids = mvdr23['recordid'].to_numpy()
+    departmentnames = mvdr23['original_departmentname'].to_numpy()
+    return {
+        row: (recordids[position], departmentnames[position], score)
+        for row, position, score in zip(positions, found, scores)
+        if position >= 0
+    }
+
+
+# Этапы сопоставления: (имя этапа, ключи строк AO db prod, словарь ключ -> (recordid, ...)).
+# Первый этап — точный поиск по (name_ru, regula_code); режим 'cascade' добавляет
+# этапы comrate.cascade, режим 'tfidf' — ближайшего соседа TF-IDF. Словарь этапа
+# может быть функцией от позиций строк, оставшихся без совпадения: так TF-IDF
+# считается только для них и только после точного поиска по всем строкам.
+def match_stages(ao_db_prod, reference, options):
+    stages = [('name_code', list(zip(ao_db_prod['name_ru'], ao_db_prod['regula_code'])), reference['mvdr_dict'])]
+    if options.match_mode == 'cascade':
+        index = reference.get('cascade') or build_cascade_index(reference['mvdr23'])
+        keys = cascade_keys(ao_db_prod)
+        stages += [(stage, keys[stage], index[stage]) for stage in CASCADE_STAGES]
+    elif options.match_mode == 'tfidf':
+        stages.append(('tfidf', range(len(ao_db_prod)), partial(find_tfidf_matches, ao_db_prod, reference, options)))
+    elif options.match_mode != 'exact':
+        raise ValueError(f"Неизвестный режим сопоставления: {options.match_mode}")
+    return stages
+
+
+# Сопоставление строк AO db prod со справочником и заполнение epgu_code.
+# Каждый этап видит только строки, оставшиеся без совпадения после предыдущих;
+# в режимах 'cascade' и 'tfidf' этап совпадения записывается в столбец match_stage.
+# Возвращает обработанный AO db prod и множество использованных recordid.
+def match(ao_db_prod, reference, options):
+    logging.info("Начало обработки строк AO db prod")
+    ao_db_prod = ao_db_prod.copy()
+    if options.reset_epgu:
+        ao_db_prod['epgu_code'] = ''
+    stages = match_stages(ao_db_prod, reference, options)
+
+    row_ids = ao_db_prod['id'].tolist()
+    epgu_codes = ao_db_prod['epgu_code'].tolist()
+    match_stage = [''] * len(ao_db_prod)
+    matched_ids = set()
+    used_keys = set()
+    skipped = set()
+    pending = range(len(ao_db_prod))
+    for stage, keys, index in stages:
+        if callable(index):
+            index = index(pending)
+        leftover = []
+        for position in pending:
+            key = keys[position]
+            found = index.get(key)
+            if not found:
+                leftover.append(position)
+                continue
+            recordid = found[0]
+            row_id = row_ids[position]
+            if not options.unique_recordids or recordid not in matched_ids:
+                epgu_codes[position] = recordid
+                match_stage[position] = stage
+                matched_ids.add(recordid)
+                used_keys.add(key)
+                if options.log_rows and stage == 'tfidf':
+                    logging.info(f"Строка id={row_id}: найдено совпадение TF-IDF с recordid={recordid}, сходство={found[2]:.3f}")
+                elif options.log_rows and stage != 'name_code':
+                    logging.info(f"Строка id={row_id}: найдено совпадение с recordid={recordid} на этапе {stage}")
+                elif options.log_rows:
+                    logging.info(f"Строка id={row_id}: найдено совпадение с recordid={recordid}")
+                continue
+            leftover.append(position)
+            skipped.add(position)
+            if options.log_rows and key in used_keys:
+                logging.warning(f"Строка id={row_id}: дубликат ключа {key}, recordid={recordid} уже использован, пропущен")
+            elif options.log_rows:
+                logging.warning(f"Строка id={row_id}: recordid={recordid} уже использован для другого ключа, пропущен")
+        if len(stages) > 1:
+            logging.info(f"Этап {stage}: сопоставлено строк {len(pending) - len(leftover)}, осталось {len(leftover)}")
+        pending = leftover
+
+    if options.log_rows:
+        for position in pending:
+            if position not in skipped:
+                name_ru, regula_code = stages[0][1][position]
+                logging.info(f"Строка id={row_ids[position]}: совпадение не найдено для name_ru='{name_ru}', regula_code='{regula_code}'")
+    ao_db_prod['epgu_code'] = epgu_codes
+    if len(stages) > 1:
+        ao_db_prod['match_stage'] = match_stage
+    logging.info(f"Обработка строк AO db prod завершена, использовано recordid: {len(matched_ids)}")
+    return ao_db_prod, matched_ids
+
+
+# Добавление строк MVDR23, не попавших в сопоставление, в формате AO db prod
+def append_unprocessed(ao_db_prod, reference, matched_ids, options):
+    logging.info("Поиск необработанных строк из MVDR23")
+    mvdr23 = reference['mvdr23']
+    unprocessed_mvdr23 = mvdr23[~mvdr23['recordid'].isin(matched_ids)]
+    logging.info(f"Найдено необработанных строк из MVDR23: {len(unprocessed_mvdr23)}")
+    if unprocessed_mvdr23.empty:
+        logging.info("Необработанных строк не найдено")
+        return ao_db_prod.copy()
+
+    code_column = 'original_departmentcode' if options.restore_originals else 'departmentcode'
+    unprocessed_formatted = pd.DataFrame({
+        'id': [''] * len(unprocessed_mvdr23),
+        'name_ru': unprocessed_mvdr23['departmentname'],
+        'name_en': [options.appended_name_en] * len(unprocessed_mvdr23),
+        'regula_code': unprocessed_mvdr23[code_column],
+        'elpost_code': [''] * len(unprocessed_mvdr23),
+        'epgu_code': unprocessed_mvdr23['recordid']
+    })
+    if options.source_column:
+        unprocessed_formatted['source'] = MVDR_SOURCE
+    if options.log_rows:
+        for recordid, departmentname in zip(unprocessed_mvdr23['recordid'], unprocessed_mvdr23['departmentname']):
+            logging.info(f"Необработанная строка recordid={recordid}: добавлена как name_ru='{departmentname}', epgu_code='{recordid}'")
+    logging.info("Необработанные строки добавлены в итоговый результат")
+    return pd.concat([ao_db_prod, unprocessed_formatted], ignore_index=True)
+
+
+# Возврат исходных regula_code и распределение исходных departmentname по epgu_code
+def restore_originals(final_data, reference, options):
+    final_data = final_data.copy()
+    if options.restore_originals:
+        logging.info("Распределение исходных departmentname из MVDR23")
+        final_data['regula_code'] = final_data['original_regula_code'].fillna(final_data['regula_code'])
+        final_data['name_ru'] = final_data['epgu_code'].map(reference['recordid_to_departmentname']).fillna(final_data['name_ru'])
+    return final_data.drop(columns=['original_regula_code'], errors='ignore')
+
+
+# Сортировка по id без изменения типа
+def sort_by_id(final_data, options):
+    if not options.sort_by_id:
+        return final_data
+    logging.info("Сортировка данных по полю id")
+    final_data = final_data.assign(id_sort=pd.to_numeric(final_data['id'], errors='coerce'))
+    final_data = final_data.sort_values(by='id_sort', na_position='last')
+    return final_data.drop(columns=['id_sort'])
+
+
+def non_empty(column):
+    return column.notna() & (column != '')
+
+
+# Строки с непустым id, которым не удалось присвоить epgu_code
+def select_unmatched(ao_db_prod, final_data, options):
+    if options.unmatched == 'none':
+        return None
+    if options.unmatched not in ('final', 'ao'):
+        raise ValueError(f"Неизвестный режим выборки несопоставленных строк: {options.unmatched}")
+    source = final_data if options.unmatched == 'final' else ao_db_prod
+    unmatched_with_id = source[non_empty(source['id']) & ~non_empty(source['epgu_code'])]
+    logging.info(f"Найдено строк с непустым id и пустым epgu_code: {len(unmatched_with_id)}")
+    return unmatched_with_id.drop(columns=['source'], errors='ignore')
+
+
+# Подсчёт статистики
+def compute_stats(ao_db_prod, mvdr23, final_data, matched_ids, unmatched_with_id=None):
+    stats = {
+        'ao_rows': len(ao_db_prod),
+        'mvdr_rows': len(mvdr23),
+        'total_rows': len(final_data),
+        'rows_with_id': int(non_empty(final_data['id']).sum()),
+        'rows_with_elpost': int(non_empty(final_data['elpost_code']).sum()),
+        'rows_with_epgu': int(non_empty(final_data['epgu_code']).sum()),
+        'unique_epgu': int(final_data['epgu_code'].nunique()),
+        'matched_rows': len(matched_ids),
+        'unmatched_with_id': None if unmatched_with_id is None else len(unmatched_with_id),
+    }
+    if 'match_stage' in ao_db_prod.columns:
+        stage_counts = ao_db_prod['match_stage'].value_counts()
+        for stage in ['name_code', *CASCADE_STAGES, 'tfidf']:
+            if stage in stage_counts:
+                stats[f'matched_{stage}'] = int(stage_counts[stage])
+    return stats
+
+
+def log_stats(stats):
+    logging.info("Статистика:")
+    logging.info(f" - Строк в AO db prod изначально: {stats['ao_rows']}")
+    logging.info(f" - Строк в MVDR23 изначально: {stats['mvdr_rows']}")
+    logging.info(f" - Всего строк в результирующем файле: {stats['total_rows']}")
+    logging.info(f" - Строк с непустым id: {stats['rows_with_id']}")
+    logging.info(f" - Строк с непустым elpost_code: {stats['rows_with_elpost']}")
+    logging.info(f" - Строк с непустым epgu_code: {stats['rows_with_epgu']}")
+    logging.info(f" - Уникальных epgu_code: {stats['unique_epgu']}")
+    logging.info(f" - Строк успешно объединено: {stats['matched_rows']}")
+    for key, value in stats.items():
+        if key.startswith('matched_') and key != 'matched_rows':
+            logging.info(f"   - на этапе {key[len('matched_'):]}: {value}")
+
+
+# Сохранение результата и (если выбрана) выборки несопоставленных строк
+def write_outputs(final_data, unmatched_with_id, options):
+    logging.info(f"Сохранение результата в файл {options.output_file}")
+    try:
+        final_data.to_csv(options.output_file, sep=';', index=False, encoding='utf-8')
+        if unmatched_with_id is not None:
+            unmatched_with_id.to_csv(options.unmatched_file, sep=';', index=False, encoding='utf-8')
+            logging.info(f"Строки с непустым id и пустым epgu_code сохранены в {options.unmatched_file}")
+        logging.info("Результат успешно сохранён")
+    except Exception as e:
+        logging.error(f"Ошибка при сохранении файла: {e}")
+        raise
+
+
+# Объединение уже загруженных таблиц в памяти.
+# Справочник можно передать готовым (reference из load_reference/prepare_reference),
+# тогда mvdr23 не нужен. Возвращает итоговую таблицу, выборку несопоставленных строк
+# (или None) и статистику.
+def merge_frames(ao_db_prod, mvdr23=None, options=None, reference=None):
+    options = options or MergeOptions()
+    if reference is None:
+        reference = prepare_reference(mvdr23, options)
+    ao_processed = normalize_ao(ao_db_prod, options)
+    ao_processed, matched_ids = match(ao_processed, reference, options)
+    final_data = append_unprocessed(ao_processed, reference, matched_ids, options)
+    final_data = restore_originals(final_data, reference, options)
+    final_data = sort_by_id(final_data, options)
+    unmatched_with_id = select_unmatched(ao_processed, final_data, options)
+    stats = compute_stats(ao_processed, reference['mvdr23'], final_data, matched_ids, unmatched_with_id)
+    log_stats(stats)
+    return final_data, unmatched_with_id, stats
+
+
+# Полный прогон: чтение файлов, объединение, сохранение
+def run(options):
+    ao_db_prod, mvdr23 = read_inputs(options)
+    final_data, unmatched_with_id, stats = merge_frames(ao_db_prod, mvdr23, options)
+    write_outputs(final_data, unmatched_with_id, options)
+    return stats
@@ -0,0 +1,119 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+# Векторизатор символьных n-грамм (по границам слов) для нормализованных названий.
+# max_df отбрасывает n-граммы, которые встречаются больше чем в этой доле названий
+# справочника («ОТДЕЛ», «ПО », «РАЙОН»...): они почти не влияют на сходство,
+# но делают произведение матриц практически плотным.
+def build_vectorizer(ngram_range=(2, 4), max_df=0.1):
+    return TfidfVectorizer(
+        analyzer='char_wb',
+        ngram_range=ngram_range,
+        lowercase=False,
+        sublinear_tf=True,
+        max_df=max_df,
+        dtype=np.float32
+    )
+
+
+# Сколько строк запроса помещается в бюджет памяти: разреженный блок сходств
+# (float32 + int32 индекс на ненулевой элемент) в худшем случае плотного заполнения
+# плюс временные массивы при перемножении
+def chunk_rows_for_budget(n_ref, memory_budget_mb):
+    bytes_per_row = max(n_ref, 1) * (4 + 4) * 2
+    return max(1, int(memory_budget_mb * 1024 * 1024 // bytes_per_row))
+
+
+# Top-k ближайших строк reference для каждой строки query по косинусному сходству.
+# Матрицы TF-IDF уже L2-нормированы, поэтому сходство — это просто скалярное произведение.
+# Перемножение идёт блоками строк query, блоки считаются в пуле потоков,
+# бюджет памяти делится между одновременно работающими блоками. Блок остаётся
+# разреженным: сходства ниже threshold отбрасываются, top-k выбирается
+# только среди сохранённых значений строки; при равном сходстве раньше идёт
+# строка reference с меньшей позицией.
+def top_k_neighbours(query, reference, k=5, threshold=0.0, memory_budget_mb=512, n_jobs=None):
+    n_query, n_ref = query.shape[0], reference.shape[0]
+    k = min(k, n_ref)
+    indices = np.full((n_query, k), -1, dtype=np.int64)
+    scores = np.zeros((n_query, k), dtype=np.float32)
+    if n_query == 0 or k == 0:
+        return indices, scores
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    chunk = chunk_rows_for_budget(n_ref, memory_budget_mb / n_jobs)
+    query = query.tocsr()
+    reference_t = reference.T.tocsc()
+
+    def process(start):
+        stop = min(start + chunk, n_query)
+        block = (query[start:stop] @ reference_t).tocsr()
+        block.data[block.data < threshold] = 0
+        block.eliminate_zeros()
+        for row in range(stop - start):
+            row_start, row_stop = block.indptr[row], block.indptr[row + 1]
+            if row_start == row_stop:
+                continue
+            row_scores = block.data[row_start:row_stop]
+            row_indices = block.indices[row_start:row_stop]
+            # После отсечения по порогу в строке немного значений, поэтому она
+            # сортируется целиком: равные сходства на границе k упорядочены по позиции
+            order = np.lexsort((row_indices, -row_scores))[:k]
+            indices[start + row, :len(order)] = row_indices[order]
+            scores[start + row, :len(order)] = row_scores[order]
+
+    starts = range(0, n_query, chunk)
+    logging.info(f"TF-IDF: {n_query} x {n_ref}, блоков: {len(starts)} по {chunk} строк, потоков: {n_jobs}")
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        list(pool.map(process, starts))
+    return indices, scores
+
+
+# Индекс справочника для поиска TF-IDF: обученный векторизатор и матрица названий.
+# Строится один раз вместе с остальными индексами справочника (см. pipeline.index_reference).
+def build_tfidf_index(mvdr_names, ngram_range=(2, 4), max_df=0.1):
+    mvdr_names = list(mvdr_names)
+    # В маленьком справочнике доля max_df меньше одного названия — отсечение не нужно
+    if len(mvdr_names) * max_df < 1:
+        max_df = 1.0
+    vectorizer = build_vectorizer(ngram_range, max_df)
+    matrix = vectorizer.fit_transform(mvdr_names)
+    logging.info(f"TF-IDF: словарь n-грамм {len(vectorizer.vocabulary_)}, названий справочника {len(mvdr_names)}")
+    return {'vectorizer': vectorizer, 'matrix': matrix}
+
+
+# Лучший кандидат из MVDR23 для каждой строки AO db prod.
+# Среди top-k соседей со сходством не ниже threshold предпочитается кандидат
+# с тем же кодом подразделения, иначе берётся самый похожий.
+# index — готовый build_tfidf_index(mvdr_names); без него индекс строится здесь.
+# Возвращает позиции строк mvdr (-1, если кандидата нет) и их сходство.
+def nearest_mvdr(ao_names, ao_codes, mvdr_names, mvdr_codes, k=5, threshold=0.85,
+                 memory_budget_mb=512, n_jobs=None, ngram_range=(2, 4), max_df=0.1, index=None):
+    ao_names = list(ao_names)
+    if not ao_names:
+        return np.full(0, -1, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    index = index or build_tfidf_index(mvdr_names, ngram_range, max_df)
+    ao_matrix = index['vectorizer'].transform(ao_names)
+    logging.info(f"TF-IDF: порог сходства {threshold}")
+
+    indices, scores = top_k_neighbours(ao_matrix, index['matrix'], k, threshold, memory_budget_mb, n_jobs)
+    positions = np.full(len(indices), -1, dtype=np.int64)
+    best_scores = np.zeros(len(indices), dtype=np.float32)
+    if indices.shape[1] == 0:
+        return positions, best_scores
+
+    mvdr_codes = np.asarray(mvdr_codes, dtype=object)
+    ao_codes = np.asarray(ao_codes, dtype=object)
+    passed = (scores >= threshold) & (indices >= 0)
+    same_code = passed & (mvdr_codes[np.clip(indices, 0, None)] == ao_codes[:, None])
+    choice = np.where(same_code.any(axis=1), same_code.argmax(axis=1), passed.argmax(axis=1))
+    rows = np.arange(len(indices))
+    found = passed[rows, choice]
+    positions[found] = indices[rows, choice][found]
+    best_scores[found] = scores[rows, choice][found]
+    logging.info(f"TF-IDF: найдено кандидатов {int(found.sum())} из {len(indices)}")
+    return positions, best_scores
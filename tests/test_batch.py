@@ -0,0 +1,86 @@
+import logging
+
+import pytest
+
+from comrate import batch
+from comrate.batch import collect_inputs, output_names, run_batch
+from comrate.cli import main
+from comrate.options import make_options
+
+AO_HEADER = 'id;name_ru;name_en;regula_code;elpost_code;epgu_code\n'
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    for system, rows in [('sysA', '1;ОВД А;;022-001;;\n2;ОВД В;;050-001;;\n'), ('sysB', '3;ОВД Б;;022-002;;\n')]:
+        (tmp_path / 'in' / system).mkdir(parents=True)
+        (tmp_path / 'in' / system / 'day1.csv').write_text(AO_HEADER + rows, encoding='utf-8')
+    (tmp_path / 'in' / 'sysB' / 'bad.csv').write_text('id;foo\n1;x\n', encoding='utf-8')
+    reference_file = tmp_path / 'mvdr.csv'
+    reference_file.write_text(
+        'recordid;departmentname;departmentcode;regioncode\n'
+        'r1;ОВД А;022-001;2\n'
+        'r2;ОВД Б;022-002;2\n',
+        encoding='utf-8'
+    )
+    return tmp_path
+
+
+def test_collect_inputs_from_directory_and_globs(inputs):
+    directory = str(inputs / 'in' / 'sysB')
+    pattern = str(inputs / 'in' / '*' / 'day1.csv')
+    files = collect_inputs([directory, pattern])
+    assert files == [
+        str(inputs / 'in' / 'sysB' / 'bad.csv'),
+        str(inputs / 'in' / 'sysB' / 'day1.csv'),
+        str(inputs / 'in' / 'sysA' / 'day1.csv'),
+    ]
+
+
+def test_output_names_keep_directories_apart(tmp_path):
+    names = output_names([str(tmp_path / 'sysA' / 'day1.csv'), str(tmp_path / 'sysB' / 'day1.csv')])
+    assert sorted(names.values()) == ['sysA__day1', 'sysB__day1']
+    names = output_names([str(tmp_path / 'sysA' / 'day1.csv'), str(tmp_path / 'sysA' / 'day2.csv')])
+    assert sorted(names.values()) == ['day1', 'day2']
+
+
+def test_output_names_reject_clashes(tmp_path):
+    with pytest.raises(ValueError, match='a__b__c'):
+        output_names([str(tmp_path / 'a__b' / 'c.csv'), str(tmp_path / 'a' / 'b__c.csv')])
+
+
+def test_failed_file_gets_error_row_with_one_worker(inputs):
+    options = make_options('post_main', reference_file=str(inputs / 'mvdr.csv'), log_rows=False)
+    output_dir = inputs / 'out'
+    summary = run_batch([str(inputs / 'in' / '*' / '*.csv')], options, str(output_dir), workers=1)
+
+    assert sorted(path.name for path in output_dir.iterdir()) == [
+        'batch_summary.csv',
+        'sysA__day1_result.csv', 'sysA__day1_unmatched_with_id.csv',
+        'sysB__day1_result.csv', 'sysB__day1_unmatched_with_id.csv',
+    ]
+    errors = summary.set_index('input_file')['error']
+    assert errors[str(inputs / 'in' / 'sysB' / 'bad.csv')] == "KeyError('regula_code')"
+    assert errors.drop(str(inputs / 'in' / 'sysB' / 'bad.csv')).isna().all()
+    # Счётчики остаются целыми и при наличии строки ошибки
+    assert str(summary['ao_rows'].dtype) == 'Int64'
+    lines = (output_dir / 'batch_summary.csv').read_text(encoding='utf-8').splitlines()
+    assert '.0;' not in ''.join(lines)
+
+
+def test_cli_batch_exit_status(inputs, monkeypatch, capsys):
+    monkeypatch.chdir(inputs)
+    reference = ['--reference', 'mvdr.csv', '--workers', '1']
+    assert main(['batch', 'in/sysA', '--output-dir', 'ok', *reference]) == 0
+    assert main(['batch', 'in/sysB', '--output-dir', 'failed', *reference]) == 1
+    assert 'с ошибками: 1' in capsys.readouterr().out
+
+
+def test_worker_log_uses_parent_encoding(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging.getLogger(), 'handlers', [])
+    log_file = tmp_path / 'merge.log'
+    batch._init_worker(None, str(log_file), 'cp1251')
+    logging.info("Обработка файла")
+    for handler in logging.getLogger().handlers:
+        handler.close()
+    assert 'Обработка файла' in log_file.read_bytes().decode('cp1251')
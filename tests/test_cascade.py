@@ -0,0 +1,65 @@
+import pandas as pd
+
+from comrate import pipeline
+from comrate.cascade import CASCADE_STAGES, build_cascade_index, unique_index
+from comrate.options import make_options
+
+# Маленький справочник: название 'ОВД Б' и код '050-001' встречаются дважды,
+# у 'ОВД Д' нет кода
+MVDR23 = pd.DataFrame({
+    'recordid': ['r1', 'r2', 'r3', 'r4', 'r5', 'r6'],
+    'departmentname': ['ОВД А', 'ОВД Б', 'ОВД Б', 'ОВД В', 'ОВД Г', 'ОВД Д'],
+    'departmentcode': ['022-001', '022-002', '772-002', '050-001', '050-001', None],
+    'regioncode': ['2', '2', '77', '5', '5', '7'],
+})
+
+AO_DB_PROD = pd.DataFrame({
+    'id': ['1', '2', '3', '4', '5', '6', '7'],
+    'name_ru': ['ОВД А', 'ОВД Д', 'ОВД ПЕРЕИМЕНОВАН', 'ОВД Б', 'ОВД Е', 'ОВД Б', 'ОВД В'],
+    'name_en': [''] * 7,
+    'regula_code': ['022-001', '070-123', '022-002', '779-010', '050-001', '991-000', '772-002'],
+    'elpost_code': [''] * 7,
+    'epgu_code': [''] * 7,
+})
+
+
+def _match(match_mode):
+    options = make_options('main', match_mode=match_mode, log_rows=False)
+    reference = pipeline.prepare_reference(MVDR23, options)
+    ao_processed, _ = pipeline.match(pipeline.normalize_ao(AO_DB_PROD, options), reference, options)
+    return ao_processed.set_index('id')
+
+
+def test_unique_index_keeps_only_unambiguous_complete_keys():
+    keys = ['a', 'b', 'b', '', ('c', '02'), ('c', '')]
+    index = unique_index(keys, ['r1', 'r2', 'r3', 'r4', 'r5', 'r6'], ['A', 'B', 'B2', '', 'C', 'C2'])
+    assert index == {'a': ('r1', 'A'), ('c', '02'): ('r5', 'C')}
+
+
+def test_cascade_index_skips_duplicate_names_and_codes():
+    options = make_options('main', match_mode='cascade', log_rows=False)
+    index = build_cascade_index(pipeline.normalize_reference(MVDR23, options))
+    assert set(index) == set(CASCADE_STAGES)
+    assert set(index['name']) == {'ОВД А', 'ОВД В', 'ОВД Г', 'ОВД Д'}
+    assert set(index['code']) == {'022-001', '022-002', '772-002'}
+    assert index['name_region'][('ОВД Б', '02')][0] == 'r2'
+    assert index['name_region'][('ОВД Б', '77')][0] == 'r3'
+
+
+def test_cascade_stages_run_in_order():
+    ao_processed = _match('cascade')
+    assert ao_processed['epgu_code'].to_dict() == {
+        '1': 'r1', '2': 'r6', '3': 'r2', '4': 'r3', '5': '', '6': '', '7': 'r4',
+    }
+    # Строка 7 находится и по названию (r4), и по коду (r3): этап name идёт раньше code
+    assert ao_processed['match_stage'].to_dict() == {
+        '1': 'name_code', '2': 'name', '3': 'code', '4': 'name_region', '5': '', '6': '', '7': 'name',
+    }
+
+
+def test_exact_mode_matches_only_name_and_code():
+    ao_processed = _match('exact')
+    assert ao_processed['epgu_code'].to_dict() == {
+        '1': 'r1', '2': '', '3': '', '4': '', '5': '', '6': '', '7': '',
+    }
+    assert 'match_stage' not in ao_processed
@@ -0,0 +1,106 @@
+import logging
+from dataclasses import replace
+
+import pytest
+
+from comrate import checkpoint, pipeline
+from comrate.checkpoint import run_staged
+from comrate.options import STAGE_NAMES, make_options
+
+
+@pytest.fixture
+def options(tmp_path):
+    ao_file = tmp_path / 'ao.csv'
+    ao_file.write_text(
+        'id;name_ru;name_en;regula_code;elpost_code;epgu_code\n'
+        '1;ОВД А;;022-001;;\n'
+        '2;овд б;;022-002;;\n'
+        '3;ОВД В;;050-001;;\n',
+        encoding='utf-8'
+    )
+    reference_file = tmp_path / 'mvdr.csv'
+    reference_file.write_text(
+        'recordid;departmentname;departmentcode;regioncode\n'
+        'r1;ОВД А;022-001;2\n'
+        'r2;ОВД Б;022-002;2\n'
+        'r3;ОВД Г;050-002;5\n',
+        encoding='utf-8'
+    )
+    return make_options(
+        'post_main',
+        ao_file=str(ao_file),
+        reference_file=str(reference_file),
+        output_file=str(tmp_path / 'result.csv'),
+        unmatched_file=str(tmp_path / 'unmatched.csv'),
+        log_rows=False
+    )
+
+
+# Этапы, которые выполнялись (а не загружались из артефактов) в прогоне
+def _run(options, checkpoint_dir, caplog, **kwargs):
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        stats = run_staged(options, str(checkpoint_dir), **kwargs)
+    executed = [
+        name for name in STAGE_NAMES
+        if f"Этап {name}: выполнение" in caplog.messages
+    ]
+    return stats, executed
+
+
+def test_first_run_matches_plain_pipeline(options, tmp_path, caplog):
+    stats, executed = _run(options, tmp_path / 'checkpoints', caplog)
+    assert executed == list(STAGE_NAMES)
+    staged_output = (tmp_path / 'result.csv').read_bytes()
+
+    plain = make_options('post_main', ao_file=options.ao_file, reference_file=options.reference_file,
+                         output_file=str(tmp_path / 'plain.csv'), unmatched_file=str(tmp_path / 'plain_unmatched.csv'),
+                         log_rows=False)
+    assert pipeline.run(plain) == stats
+    assert (tmp_path / 'plain.csv').read_bytes() == staged_output
+
+
+def test_unchanged_options_only_write(options, tmp_path, caplog):
+    _run(options, tmp_path / 'checkpoints', caplog)
+    _, executed = _run(options, tmp_path / 'checkpoints', caplog)
+    assert executed == ['write']
+
+
+def test_unmatched_change_reruns_stats_and_write(options, tmp_path, caplog):
+    _run(options, tmp_path / 'checkpoints', caplog)
+    stats, executed = _run(replace(options, unmatched='none'),
+                           tmp_path / 'checkpoints', caplog)
+    assert executed == ['stats', 'write']
+    assert stats['unmatched_with_id'] is None
+
+
+def test_normalization_change_reruns_everything(options, tmp_path, caplog):
+    _run(options, tmp_path / 'checkpoints', caplog)
+    _, executed = _run(replace(options, normalization='lower'),
+                       tmp_path / 'checkpoints', caplog)
+    assert executed == list(STAGE_NAMES)
+
+
+def test_changed_input_reruns_everything(options, tmp_path, caplog):
+    _run(options, tmp_path / 'checkpoints', caplog)
+    with open(options.ao_file, 'a', encoding='utf-8') as f:
+        f.write('4;ОВД Г;;050-002;;\n')
+    _, executed = _run(options, tmp_path / 'checkpoints', caplog)
+    assert executed == list(STAGE_NAMES)
+
+
+def test_code_change_reruns_everything(options, tmp_path, caplog, monkeypatch):
+    _run(options, tmp_path / 'checkpoints', caplog)
+    monkeypatch.setattr(checkpoint, 'source_digest', lambda: 'changed')
+    _, executed = _run(options, tmp_path / 'checkpoints', caplog)
+    assert executed == list(STAGE_NAMES)
+
+
+def test_from_and_until_stage(options, tmp_path, caplog):
+    stats, executed = _run(options, tmp_path / 'checkpoints', caplog, until_stage='match')
+    assert stats is None
+    assert executed == list(STAGE_NAMES[:STAGE_NAMES.index('match') + 1])
+    assert not (tmp_path / 'result.csv').exists()
+
+    _, executed = _run(options, tmp_path / 'checkpoints', caplog, from_stage='match')
+    assert executed == list(STAGE_NAMES[STAGE_NAMES.index('match'):])
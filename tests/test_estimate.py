@@ -0,0 +1,87 @@
+import logging
+
+from comrate.estimate import estimate, read_sample, read_strata, sample_positions, strata_of
+from comrate.options import make_options
+
+HEADER = 'id;name_ru;name_en;regula_code;elpost_code;epgu_code\n'
+
+
+def _write_reference(path):
+    path.write_text(
+        'recordid;departmentname;departmentcode;regioncode\n'
+        'r1;ОВД А;022-001;2\n'
+        'r2;ОВД Б;022-002;2\n',
+        encoding='utf-8'
+    )
+
+
+# Многострочное поле в кавычках и пустая строка не сдвигают выборку:
+# строки берутся из одного разбора файла, а не по номерам физических строк
+def test_sample_survives_multiline_fields(tmp_path):
+    ao_file = tmp_path / 'ao.csv'
+    ao_file.write_text(
+        HEADER
+        + '1;"ОВД\nА";;022-001;;\n'
+        + '\n'
+        + '2;ОВД Б;;022-002;;\n'
+        + '3;ОВД В;;050-001;;\n'
+        + '4;ОВД Б;;022-002;;\n',
+        encoding='utf-8'
+    )
+    reference_file = tmp_path / 'mvdr.csv'
+    _write_reference(reference_file)
+    options = make_options('main', ao_file=str(ao_file), reference_file=str(reference_file))
+
+    report = estimate(options, sample_size=4)
+
+    assert report['total_rows'] == 4
+    assert report['sample_rows'] == 4
+    # Выборка — весь файл: оценки точные, интервалы нулевой ширины
+    assert report['match_rate'] == (0.5, 0.5, 0.5)
+    assert report['duplicate_rate'] == (0.25, 0.25, 0.25)
+    assert report['conflict_rate'] == (0.25, 0.25, 0.25)
+
+
+
+# Частичная выборка: квоты страт пропорциональны их размерам (не меньше одной
+# строки), точечные оценки лежат внутри интервалов, строки выборки не пишутся в лог
+def test_partial_sample_quotas_and_intervals(tmp_path, caplog):
+    rows = ['1;"ОВД\nА";;022-001;;\n', '\n']
+    sizes = {'02': 39, '05': 20, '07': 9, '09': 2, '': 1}
+    for region, size in sizes.items():
+        for i in range(size):
+            code = f'{region}0-{i:03d}' if region else ''
+            # Половина строк региона 02 — повторы ключа (ОВД А, 022-001)
+            name, code = ('ОВД А', '022-001') if region == '02' and i % 2 else (f'ОВД {region}-{i}', code)
+            rows.append(f'{len(rows)};{name};;{code};;\n')
+    ao_file = tmp_path / 'ao.csv'
+    ao_file.write_text(HEADER + ''.join(rows), encoding='utf-8')
+    reference_file = tmp_path / 'mvdr.csv'
+    _write_reference(reference_file)
+    options = make_options('main', ao_file=str(ao_file), reference_file=str(reference_file))
+
+    strata = read_strata(options.ao_file, 2)
+    positions = sample_positions(strata, 18, seed=1)
+    sample = read_sample(options.ao_file, positions, chunksize=7)
+    # Первая строка многострочная, за ней пустая строка: нумерация совпадает у обоих чтений
+    assert len(strata) == 1 + sum(sizes.values())
+    assert strata_of(sample['regula_code'], 2).tolist() == strata.loc[positions].tolist()
+    assert sample['id'].tolist() == [str(position + 1) for position in positions]
+    # Доля выборки 18 / 72 = 1/4; в стратах 09 и пустой — по одной строке
+    assert strata.loc[positions].value_counts().to_dict() == {'02': 10, '05': 5, '07': 2, '09': 1, '': 1}
+
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        report = estimate(options, sample_size=18, seed=1)
+    assert report['total_rows'] == len(strata)
+    assert report['sample_rows'] == 19
+    assert report['strata'] == 5
+    for name in ('match_rate', 'unmatched_with_id_rate', 'conflict_rate', 'duplicate_rate'):
+        estimate_, low, high = report[name]
+        assert low <= estimate_ <= high, name
+        assert 0 <= low and high <= 1, name
+    assert report['duplicate_rate'][0] > 0
+    assert report['match_rate'][2] - report['match_rate'][1] > 0
+    # Сопоставление выборки не пишет в лог: там только начало пробного прогона и отчёт
+    assert caplog.messages[0].startswith('Пробный прогон: выборка 18 строк')
+    assert 'Начало обработки строк AO db prod' not in caplog.messages
@@ -0,0 +1,93 @@
+import os
+
+import pandas as pd
+
+from comrate.cli import _options_from_args, build_parser
+from comrate.options import PRESETS, make_options
+from comrate.pipeline import merge_frames
+
+MVDR23 = pd.DataFrame({
+    'recordid': ['r1', 'r2', 'r3'],
+    'departmentname': ['ОВД А', 'ОВД Б', 'ОВД В'],
+    'departmentcode': ['022-001', '022-002', '050-001'],
+    'regioncode': ['2', '2', '5'],
+})
+
+# Строки не по порядку id; у id 3 тот же ключ, что у id 1
+AO_DB_PROD = pd.DataFrame({
+    'id': ['2', '4', '1', '3'],
+    'name_ru': ['Овд  А.', 'ОВД Х', 'ОВД Б', 'ОВД Б'],
+    'name_en': [''] * 4,
+    'regula_code': ['022-001', ' 099-abc ', '022-002', '022-002'],
+    'elpost_code': [''] * 4,
+    'epgu_code': [''] * 4,
+})
+
+
+def _merge(preset, **overrides):
+    return merge_frames(AO_DB_PROD, MVDR23, make_options(preset, log_rows=False, **overrides))
+
+
+def _epgu_by_id(final_data):
+    ao_rows = final_data[final_data['id'] != '']
+    return dict(zip(ao_rows['id'], ao_rows['epgu_code']))
+
+
+def test_main_upper_normalization_restores_originals_and_sorts():
+    final_data, unmatched_with_id, stats = _merge('main')
+    assert _epgu_by_id(final_data) == {'1': 'r2', '2': 'r1', '3': '', '4': ''}
+    assert final_data['id'].tolist() == ['1', '2', '3', '4', '']
+    # Названия сопоставленных строк — из MVDR23, коды — исходные
+    assert final_data['name_ru'].tolist()[:2] == ['ОВД Б', 'ОВД А']
+    assert final_data['regula_code'].tolist()[3] == ' 099-abc '
+    assert final_data['name_en'].tolist()[-1] == 'nan'
+    assert unmatched_with_id is None
+    assert stats['matched_rows'] == 2
+
+
+def test_lower_normalization_keeps_punctuation():
+    final_data, _, _ = _merge('main', normalization='lower')
+    assert _epgu_by_id(final_data) == {'1': 'r2', '2': '', '3': '', '4': ''}
+
+
+def test_unmatched_from_final_vs_ao():
+    _, from_final, _ = _merge('post_main')
+    _, from_ao, _ = _merge('post_main_2')
+    # 'final' — после восстановления исходных кодов и сортировки по id
+    assert from_final['id'].tolist() == ['3', '4']
+    assert from_final['regula_code'].tolist() == ['022-002', ' 099-abc ']
+    assert 'original_regula_code' not in from_final
+    # 'ao' — нормализованный AO db prod в исходном порядке
+    assert from_ao['id'].tolist() == ['4', '3']
+    assert from_ao['regula_code'].tolist() == ['099-ABC', '022-002']
+    assert 'original_regula_code' in from_ao
+
+
+def test_post_main3_reuses_recordids_without_sorting():
+    final_data, unmatched_with_id, _ = _merge('post_main3')
+    assert _epgu_by_id(final_data) == {'2': '', '4': '', '1': 'r2', '3': 'r2'}
+    assert final_data['id'].tolist() == ['2', '4', '1', '3', '', '']
+    assert final_data['name_ru'].tolist()[:4] == ['овд а.', 'овд х', 'овд б', 'овд б']
+    assert final_data['name_en'].tolist()[-1] == ''
+    assert unmatched_with_id['id'].tolist() == ['2', '4']
+
+
+def test_unique_recordids_assigns_each_recordid_once():
+    final_data, _, _ = _merge('main', unique_recordids=False)
+    assert _epgu_by_id(final_data)['3'] == 'r2'
+    final_data, _, _ = _merge('main')
+    assert _epgu_by_id(final_data)['3'] == ''
+
+
+def test_cli_merge_without_overrides_is_the_preset():
+    for preset, options in PRESETS.items():
+        assert _options_from_args(build_parser().parse_args(['merge', '--preset', preset])) == options
+
+
+def test_wrapper_scripts_run_their_presets():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    scripts = {'main.py': 'main', 'post_main.py': 'post_main', 'Post_main_2.py': 'post_main_2',
+               'Post_main_v4.py': 'post_main_v4', 'post_main3.py': 'post_main3'}
+    for script, preset in scripts.items():
+        with open(os.path.join(root, script), encoding='utf-8') as f:
+            assert f"main(['merge', '--preset', '{preset}', *sys.argv[1:]])" in f.read()
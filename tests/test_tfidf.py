@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from comrate import pipeline, tfidf
+from comrate.options import make_options
+from comrate.tfidf import build_tfidf_index, chunk_rows_for_budget, nearest_mvdr, top_k_neighbours
+
+
+# Top-k по плотной матрице сходств: значения не ниже threshold,
+# по убыванию сходства, при равенстве — по позиции в справочнике
+def dense_top_k(query, reference, k, threshold):
+    dense = (query @ reference.T).toarray()
+    indices = np.full((dense.shape[0], k), -1, dtype=np.int64)
+    scores = np.zeros((dense.shape[0], k), dtype=np.float32)
+    for row, values in enumerate(dense):
+        columns = np.flatnonzero((values >= threshold) & (values > 0))
+        order = columns[np.lexsort((columns, -values[columns]))][:k]
+        indices[row, :len(order)] = order
+        scores[row, :len(order)] = values[order]
+    return indices, scores
+
+
+def _random_rows(rows, columns, seed):
+    matrix = sparse.random(rows, columns, density=0.2, random_state=seed, dtype=np.float32, format='csr')
+    return normalize(matrix).astype(np.float32)
+
+
+def test_chunk_rows_for_budget():
+    assert chunk_rows_for_budget(1000, 1) == 65
+    assert chunk_rows_for_budget(10 ** 9, 1) == 1
+    assert chunk_rows_for_budget(0, 1) > 0
+
+
+@pytest.mark.parametrize('threshold', [0.0, 0.3])
+def test_top_k_matches_dense_product_across_chunks(threshold):
+    reference = _random_rows(40, 30, seed=1)
+    # Повторы строк справочника дают равные сходства: порядок — по позиции
+    reference = sparse.vstack([reference, reference[:5]]).tocsr()
+    query = sparse.vstack([_random_rows(23, 30, seed=2), reference[:3], sparse.csr_matrix((1, 30))]).tocsr()
+
+    # Бюджет меньше одной строки: блоки по одной строке в трёх потоках
+    indices, scores = top_k_neighbours(query, reference, k=4, threshold=threshold, memory_budget_mb=0.001, n_jobs=3)
+    expected_indices, expected_scores = dense_top_k(query, reference, 4, threshold)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(scores, expected_scores)
+    assert (indices[-1] == -1).all()
+
+
+def test_top_k_with_k_above_reference_size():
+    reference = _random_rows(3, 10, seed=3)
+    query = _random_rows(5, 10, seed=4)
+    indices, scores = top_k_neighbours(query, reference, k=10, memory_budget_mb=0.001, n_jobs=2)
+    assert indices.shape == (5, 3)
+    np.testing.assert_array_equal(indices, dense_top_k(query, reference, 3, 0.0)[0])
+
+
+def test_max_df_drops_common_ngrams():
+    names = [f'ОВД РАЙОНА {chr(ord("А") + i)}{chr(ord("А") + i)}' for i in range(20)]
+    index = build_tfidf_index(names, max_df=0.1)
+    assert 'ОВ' not in index['vectorizer'].vocabulary_
+    assert 'АА' in index['vectorizer'].vocabulary_
+
+
+def test_small_reference_keeps_all_ngrams():
+    index = build_tfidf_index(['ОВД А', 'ОВД Б'], max_df=0.1)
+    assert 'ОВ' in index['vectorizer'].vocabulary_
+
+
+def test_nearest_prefers_same_code_above_threshold():
+    mvdr_names = ['ОВД ЦЕНТРАЛЬНОГО РАЙОНА', 'ОВД ЦЕНТРАЛЬНОГО РАЙОНА', 'ОВД СЕВЕРНОГО РАЙОНА']
+    mvdr_codes = ['022-001', '022-002', '022-003']
+    positions, scores = nearest_mvdr(
+        ['ОВД ЦЕНТРАЛЬНОГО РАЙОНА', 'ОВД ЦЕНТРАЛЬНОГО РАЙОНА', 'ГУ МЧС'],
+        ['022-002', '099-999', '022-001'],
+        mvdr_names, mvdr_codes, k=3, threshold=0.9
+    )
+    np.testing.assert_array_equal(positions, [1, 0, -1])
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[2] == 0
+
+
+def test_nearest_without_query_rows():
+    positions, scores = nearest_mvdr([], [], ['ОВД А'], ['022-001'])
+    assert len(positions) == 0 and len(scores) == 0
+
+
+MVDR23 = pd.DataFrame({
+    'recordid': ['r1', 'r2', 'r3'],
+    'departmentname': ['ОВД ЦЕНТРАЛЬНОГО РАЙОНА', 'ОВД СЕВЕРНОГО РАЙОНА', 'ГУ МЧС РОССИИ'],
+    'departmentcode': ['022-001', '022-002', '022-003'],
+    'regioncode': ['2', '2', '2'],
+})
+
+
+def _ao(rows):
+    return pd.DataFrame({
+        'id': [str(i + 1) for i in range(len(rows))],
+        'name_ru': [name for name, _ in rows],
+        'name_en': [''] * len(rows),
+        'regula_code': [code for _, code in rows],
+        'elpost_code': [''] * len(rows),
+        'epgu_code': [''] * len(rows),
+    })
+
+
+def _match(ao_db_prod, monkeypatch):
+    options = make_options('main', match_mode='tfidf', log_rows=False, tfidf_threshold=0.8)
+    reference = pipeline.prepare_reference(MVDR23, options)
+    queries = []
+    nearest = tfidf.nearest_mvdr
+
+    def recording_nearest(ao_names, *args, **kwargs):
+        queries.append(list(ao_names))
+        return nearest(ao_names, *args, **kwargs)
+
+    monkeypatch.setattr(tfidf, 'nearest_mvdr', recording_nearest)
+    ao_processed, _ = pipeline.match(pipeline.normalize_ao(ao_db_prod, options), reference, options)
+    return ao_processed.set_index('id'), reference, queries
+
+
+def test_tfidf_stage_runs_after_exact_pass_on_leftovers(monkeypatch):
+    ao_processed, reference, queries = _match(_ao([
+        # Нечёткий кандидат r1 стоит раньше точного совпадения с r1 и не должен его отнять
+        ('ОВД ЦЕНТРАЛЬНОГО РАЙОНА Г', '022-001'),
+        ('ОВД ЦЕНТРАЛЬНОГО РАЙОНА', '022-001'),
+        ('ОВД СЕВЕРНОГО РАЙОНА Г', '022-002'),
+        ('ПАСПОРТНЫЙ СТОЛ', '050-001'),
+    ]), monkeypatch)
+
+    assert 'tfidf' in reference
+    assert queries == [['ОВД ЦЕНТРАЛЬНОГО РАЙОНА Г', 'ОВД СЕВЕРНОГО РАЙОНА Г', 'ПАСПОРТНЫЙ СТОЛ']]
+    assert ao_processed['epgu_code'].to_dict() == {'1': '', '2': 'r1', '3': 'r2', '4': ''}
+    assert ao_processed['match_stage'].to_dict() == {'1': '', '2': 'name_code', '3': 'tfidf', '4': ''}
+
+
+def test_tfidf_mode_with_every_row_matched_exactly(monkeypatch):
+    ao_processed, _, queries = _match(_ao([('ОВД ЦЕНТРАЛЬНОГО РАЙОНА', '022-001')]), monkeypatch)
+    assert queries == []
+    assert ao_processed['epgu_code'].to_dict() == {'1': 'r1'}
+
+
+def test_tfidf_mode_with_empty_extract(monkeypatch):
+    ao_processed, _, queries = _match(_ao([]), monkeypatch)
+    assert queries == []
+    assert ao_processed.empty